@@ -1,49 +1,369 @@
-import google.generativeai as genai
 import re
 import json
+import asyncio
+import logging
+import random
+import time
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 import os
 
+from ..models.schemas import VagaInfoSchema
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; cai para a json da stdlib
+    orjson = None
+
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 API_KEY = os.getenv("API_KEY")
+# Várias chaves (de projetos distintos) separadas por vírgula multiplicam a cota disponível
+API_KEYS = [k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()] or ([API_KEY] if API_KEY else [])
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME")
+# Cotas locais por chave (opcionais): sem valor (ou 0) não há contagem local e só os 429 reais do Gemini limitam
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT") or 0)
+GEMINI_TPM_LIMIT = int(os.getenv("GEMINI_TPM_LIMIT") or 0)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1"))
+GEMINI_BACKOFF_JITTER = float(os.getenv("GEMINI_BACKOFF_JITTER", "0.25"))
+GEMINI_INPUT_TOKEN_LIMIT = int(os.getenv("GEMINI_INPUT_TOKEN_LIMIT", "30000"))
+VAGA_CACHE_MAXSIZE = int(os.getenv("VAGA_CACHE_MAXSIZE", "512"))
+VAGA_CACHE_TTL = float(os.getenv("VAGA_CACHE_TTL", str(24 * 60 * 60)))
+# Espera total máxima (s) de um item de lote pela cota; depois disso o item é registrado como erro
+BATCH_QUOTA_WAIT_MAX = float(os.getenv("BATCH_QUOTA_WAIT_MAX", "300"))
 
 
-# Configurar o cliente Gemini (faça isso uma vez)
-try:
-    if API_KEY:
-        genai.configure(api_key=API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-    else:
-        model = None
-        print("Modelo GenerativeAI não inicializado devido à falta da API Key.")
-except Exception as e:
-    print(f"Erro ao configurar a API Gemini: {e}")
-    model = None
+class GeminiRateLimitError(RuntimeError):
+    """Todas as chaves da API Gemini estão no limite; retry_after indica a espera em segundos."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(retry_after, 0.0)
+        super().__init__(f"Limite de requisições da API Gemini atingido. Tente novamente em {self.retry_after:.0f}s.")
+
+
+class PromptMuitoGrandeError(ValueError):
+    """O prompt montado excede GEMINI_INPUT_TOKEN_LIMIT e é rejeitado antes de chamar a IA."""
+
+    def __init__(self, tokens_estimados: int):
+        self.tokens_estimados = tokens_estimados
+        super().__init__(
+            f"Dados muito grandes para gerar o currículo (~{tokens_estimados} tokens; limite {GEMINI_INPUT_TOKEN_LIMIT})."
+        )
+
+
+@dataclass
+class _ChaveGemini:
+    """Modelo Gemini associado a uma chave e o consumo dela na janela de um minuto."""
+    model: "genai.GenerativeModel"
+    rpm_usado: int = 0
+    tpm_usado: int = 0
+    reinicia_em: float = 0.0
+    resfriando_ate: float = 0.0
+
+    def capacidade(self, agora: float) -> float:
+        """Fração livre da cota (RPM/TPM) na janela atual; negativa se a chave estiver em espera."""
+        if agora >= self.reinicia_em:
+            self.rpm_usado = 0
+            self.tpm_usado = 0
+            self.reinicia_em = agora + 60
+        if self.resfriando_ate > agora:
+            return -1.0
+        livre = 1.0
+        if GEMINI_RPM_LIMIT:
+            livre = min(livre, 1 - self.rpm_usado / GEMINI_RPM_LIMIT)
+        if GEMINI_TPM_LIMIT:
+            livre = min(livre, 1 - self.tpm_usado / GEMINI_TPM_LIMIT)
+        return livre
+
+    def registrar(self, tokens: int):
+        self.rpm_usado += 1
+        self.tpm_usado += tokens
+
+    def resfriar(self, agora: float, duracao: float):
+        self.resfriando_ate = agora + duracao
+
+
+def _criar_modelo(api_key: str) -> "genai.GenerativeModel":
+    """Cria um modelo com cliente assíncrono próprio, já que genai.configure altera estado global."""
+    import google.generativeai as genai
+    from google.ai import generativelanguage as glm
+
+    modelo = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    if len(API_KEYS) > 1:
+        modelo._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+    return modelo
+
+
+# O SDK do Gemini (grpc, protobuf...) é pesado: só é importado e configurado na primeira chamada
+_chaves: list[_ChaveGemini] | None = None
+if not API_KEYS:
+    logger.warning("Modelo GenerativeAI não inicializado devido à falta da API Key.")
+
+
+def _obter_chaves() -> list[_ChaveGemini]:
+    """Configura o cliente Gemini na primeira chamada (faça isso uma vez) e reaproveita nas seguintes."""
+    global _chaves
+    if _chaves is None:
+        _chaves = []
+        if API_KEYS:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=API_KEYS[0])
+                _chaves = [_ChaveGemini(model=_criar_modelo(k)) for k in API_KEYS]
+            except Exception as e:
+                logger.error("Erro ao configurar a API Gemini: %s", e)
+    return _chaves
+
+
+def _selecionar_chave() -> _ChaveGemini:
+    """Escolhe a chave com mais cota livre; levanta GeminiRateLimitError se todas estiverem esgotadas."""
+    chaves = _obter_chaves()
+    if not chaves:
+        raise RuntimeError("Modelo GenerativeAI não foi inicializado corretamente. Verifique a API Key.")
+
+    agora = time.monotonic()
+    # Empate (ex.: sem cotas locais) vai para a chave menos usada na janela, mantendo o rodízio
+    melhor = max(chaves, key=lambda c: (c.capacidade(agora), -c.rpm_usado))
+    if melhor.capacidade(agora) <= 0:
+        # Próxima liberação: fim da espera (após 429) ou reinício da janela de cota
+        liberacao = min(c.resfriando_ate if c.resfriando_ate > agora else c.reinicia_em for c in chaves)
+        raise GeminiRateLimitError(liberacao - agora)
+    return melhor
+
+
+def _estimar_tokens(prompt: str) -> int:
+    """Estimativa grosseira de tokens de entrada (~4 caracteres por token)."""
+    return len(prompt) // 4
+
+
+def _json_dumps(obj) -> str:
+    """Serializa para JSON indentado (UTF-8 legível), usando orjson quando disponível."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, indent=2, ensure_ascii=False)
+
+
+def _json_loads(texto: str):
+    """Decodifica JSON, usando orjson quando disponível (seus erros herdam de json.JSONDecodeError)."""
+    if orjson is not None:
+        return orjson.loads(texto)
+    return json.loads(texto)
+
+
+# Prompts estáticos montados uma única vez; só os dados variáveis são formatados por chamada
+_VAGA_PROMPT_TEMPLATE = (
+    "Você é um assistente especializado em análise de vagas. Extraia as seguintes informações da descrição da vaga fornecida: \n"
+    "- nomeEmpresa (string)\n"
+    "- nomenclaturaCargo (string)\n"
+    "- nivelExperiencia (string, ex: Júnior, Pleno, Sênior, Especialista)\n"
+    "- skillsTecnicas (lista de strings)\n"
+    "- softSkills (lista de strings)\n"
+    "- responsabilidadesDaVaga (lista de strings)\n"
+    "- tomDaVaga (string, ex: Formal, Informal, Corporativo)\n"
+    "- palavrasChave (lista de strings)\n\n"
+    "Retorne os dados estritamente como um objeto JSON válido, sem nenhum texto adicional antes ou depois.\n\n"
+    "Descrição da vaga:\n{descricao_vaga}"
+)
+
+_CV_PROMPT_TEMPLATE = """
+    Gere um currículo em texto puro e formatado para ATS (sem tabelas, colunas múltiplas ou imagens), baseado nas informações do usuário abaixo e adaptado para a vaga fornecida. Use uma estrutura profissional com seções como Contato, Endereço, Objetivo, Experiência Profissional, Projetos, Formação Acadêmica e Habilidades, tudo de acordo com os dados do usuário.
+    Certifique-se de utilizar os dados reais fornecidos pelo usuário (telefone, email, LinkedIn etc.) no currículo, sem substituí-los por placeholders genéricos como [Seu Email].
+    O objetivo deve ser conciso e direcionado para a vaga, evitando textos genéricos.
+    Na seção de Habilidades, liste as habilidades técnicas e interpessoais relevantes do usuário, priorizando aquelas mencionadas na descrição da vaga.
+
+    Tecnologias pedidas pela vaga que o usuário domina (liste-as como habilidades): {dominadas}
+    Tecnologias pedidas pela vaga que o usuário não domina (liste cada uma exatamente como "Interesse em aprender [tecnologia]"): {aprender}
+
+    Dados do usuário:
+    {dados}
+
+    Informações da vaga:
+    {vaga}
+
+    Retorne apenas o texto completo do currículo, começando pelo nome do candidato, formatado de forma clara e profissional, sem explicações adicionais, introduções, despedidas ou blocos de código Markdown. Siga a estrutura padrão de currículos ATS.
+    """
+
+
+# Tecnologias que o usuário domina (chave em minúsculas -> nome exibido no currículo)
+_TECNOLOGIAS_DOMINADAS = {
+    "javascript": "Javascript",
+    "html": "HTML",
+    "css": "CSS",
+    "bootstrap": "Bootstrap",
+    "react": "React",
+    "vue.js": "Vue.js",
+    "node.js": "Node.js",
+    "python": "Python",
+    "flask": "Flask",
+    "streamlit": "Streamlit",
+    "java": "Java",
+    "spring boot": "Spring Boot",
+    "sql": "SQL",
+}
+
+# Grafias alternativas (já normalizadas por _normalizar_skill) -> chave em _TECNOLOGIAS_DOMINADAS
+_ALIASES_TECNOLOGIAS = {
+    "js": "javascript",
+    "spring": "spring boot",
+}
+
+_VERSAO_SKILL_RE = re.compile(r"[\s\-_]*v?\d+(?:\.\d+)*$")
+_SEPARADORES_SKILL_RE = re.compile(r"[\s.\-_]+")
+
+
+def _normalizar_skill(skill: str) -> str:
+    """Reduz uma skill a uma chave comparável: 'React.js', 'ReactJS' e 'react' viram 'react'; 'HTML5' vira 'html'."""
+    chave = _VERSAO_SKILL_RE.sub("", skill.strip().lower())
+    chave = _SEPARADORES_SKILL_RE.sub("", chave)
+    if len(chave) > 2 and chave.endswith("js"):
+        chave = chave[:-2]
+    return chave
+
+
+# Índice de busca: chave normalizada (inclusive aliases) -> nome exibido no currículo
+_TECNOLOGIAS_POR_CHAVE = {_normalizar_skill(k): v for k, v in _TECNOLOGIAS_DOMINADAS.items()}
+_TECNOLOGIAS_POR_CHAVE.update(
+    {apelido: _TECNOLOGIAS_DOMINADAS[chave] for apelido, chave in _ALIASES_TECNOLOGIAS.items()}
+)
+
+
+# Padrões compilados uma única vez no carregamento do módulo
+_MD_FENCE_RE = re.compile(r"^```(?:[a-zA-Z0-9]+)?\n?|\n?```$", re.MULTILINE)
 
 def limpar_codigo_markdown(resposta: str) -> str:
     """Remove blocos de código Markdown do início e fim da string."""
     # Remove ```json ... ``` ou ``` ... ```
-    cleaned = re.sub(r"^```(?:[a-zA-Z0-9]+)?\n?|\n?```$", "", resposta.strip(), flags=re.MULTILINE)
-    return cleaned.strip()
+    return _MD_FENCE_RE.sub("", resposta.strip()).strip()
 
 
-async def chamar_agente_ia(prompt: str, temperatura: float = 0.6, max_tokens: int = 8000) -> str:
-    """Chama a API Generative AI de forma assíncrona."""
-    if not model:
-        raise RuntimeError("Modelo GenerativeAI não foi inicializado corretamente. Verifique a API Key.")
+def _extrair_objeto_json(texto: str) -> str | None:
+    """Localiza o primeiro objeto JSON balanceado no texto, ignorando chaves dentro de strings."""
+    inicio = texto.find("{")
+    if inicio == -1:
+        return None
 
-    try:
-        response = await model.generate_content_async( # Usar versão async
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                candidate_count=1,
-                max_output_tokens=max_tokens,
-                temperature=temperatura
+    profundidade = 0
+    em_string = False
+    escapado = False
+    for i in range(inicio, len(texto)):
+        c = texto[i]
+        if em_string:
+            if escapado:
+                escapado = False
+            elif c == "\\":
+                escapado = True
+            elif c == '"':
+                em_string = False
+        elif c == '"':
+            em_string = True
+        elif c == "{":
+            profundidade += 1
+        elif c == "}":
+            profundidade -= 1
+            if profundidade == 0:
+                return texto[inicio:i + 1]
+    return None
+
+
+# Limita quantas chamadas ao Gemini ficam em andamento ao mesmo tempo neste processo
+_GEMINI_SEM = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+# Maior espera de backoff que vale a pena aguardar dentro da própria requisição
+_BACKOFF_MAXIMO = GEMINI_BACKOFF_BASE * 2 ** (GEMINI_MAX_ATTEMPTS - 1) * (1 + GEMINI_BACKOFF_JITTER)
+
+
+def _tempo_backoff(tentativa: int) -> float:
+    """Espera exponencial com jitter para a tentativa informada (0, 1, 2...)."""
+    jitter = random.uniform(-GEMINI_BACKOFF_JITTER, GEMINI_BACKOFF_JITTER)
+    return GEMINI_BACKOFF_BASE * 2 ** tentativa * (1 + jitter)
+
+
+async def _gerar_conteudo(prompt: str, temperatura: float, max_tokens: int, stream: bool = False, json_mode: bool = False,
+                          response_schema=None):
+    """Envia o prompt ao Gemini sob o semáforo de concorrência, com rodízio de chaves e backoff em 429.
+
+    Com stream=True o SDK só aguarda o primeiro trecho; a vaga no semáforo continua ocupada e quem
+    consome o stream deve liberá-la (_GEMINI_SEM.release()) ao terminar.
+    """
+    import google.generativeai as genai
+    from google.api_core.exceptions import ResourceExhausted
+
+    tentativas = max(GEMINI_MAX_ATTEMPTS, len(_obter_chaves()))
+    for tentativa in range(tentativas):
+        try:
+            chave = _selecionar_chave()
+        except GeminiRateLimitError as e:
+            # Aguarda só esperas curtas de backoff; cota do minuto esgotada volta como 429 ao cliente
+            if tentativa == tentativas - 1 or e.retry_after > _BACKOFF_MAXIMO:
+                raise
+            await asyncio.sleep(e.retry_after)
+            chave = _selecionar_chave()
+
+        tokens_estimados = _estimar_tokens(prompt)
+        chave.registrar(tokens_estimados + max_tokens)
+        await _GEMINI_SEM.acquire()
+        try:
+            inicio = time.perf_counter()
+            response = await chave.model.generate_content_async( # Usar versão async
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    candidate_count=1,
+                    max_output_tokens=max_tokens,
+                    temperature=temperatura,
+                    # Em modo JSON o Gemini garante um objeto JSON puro, sem Markdown ao redor
+                    response_mime_type="application/json" if json_mode else None,
+                    # O schema (modelo Pydantic) garante também o formato do objeto, não só JSON válido
+                    response_schema=response_schema if json_mode else None
+                ),
+                stream=stream
+            )
+        except ResourceExhausted as e:
+            _GEMINI_SEM.release()
+            espera = _tempo_backoff(tentativa)
+            logger.warning(
+                "Chave da API Gemini atingiu o limite: %s", e,
+                extra={"tentativa": tentativa + 1, "tentativas": tentativas, "espera_s": round(espera, 2)}
             )
+            chave.resfriar(time.monotonic(), espera)
+            continue
+        except BaseException:
+            _GEMINI_SEM.release()
+            raise
+
+        if not stream:
+            _GEMINI_SEM.release()
+        logger.info(
+            "gemini.call",
+            extra={
+                "stream": stream,
+                "tokens_entrada": tokens_estimados,
+                "latency_ms": round((time.perf_counter() - inicio) * 1000),
+            }
         )
+        return response
+    raise GeminiRateLimitError(espera)
+
+
+async def chamar_agente_ia(prompt: str, temperatura: float = 0.6, max_tokens: int = 8000, json_mode: bool = False,
+                           response_schema=None) -> str:
+    """Chama a API Generative AI de forma assíncrona, alternando entre as chaves disponíveis.
+
+    Com json_mode=True a resposta é pedida como application/json (no formato de response_schema, se
+    informado) e devolvida sem limpeza de Markdown.
+    """
+    try:
+        response = await _gerar_conteudo(prompt, temperatura, max_tokens, json_mode=json_mode, response_schema=response_schema)
+
         # Adicionar tratamento de erro para safety ratings se necessário
         if not response.parts:
              if response.prompt_feedback.block_reason:
@@ -51,74 +371,221 @@ async def chamar_agente_ia(prompt: str, temperatura: float = 0.6, max_tokens: in
              else:
                  raise ValueError("Resposta da IA vazia ou inválida.")
 
+        if json_mode:
+            return response.text
         resposta_texto = limpar_codigo_markdown(response.text)
         return resposta_texto
     except Exception as e:
         # Logar o erro aqui seria bom
-        print(f"Erro ao chamar a API Gemini: {e}")
+        logger.error("Erro ao chamar a API Gemini: %s", e)
         raise  # Re-lança a exceção para ser tratada no endpoint
 
+
+async def chamar_agente_ia_stream(prompt: str, temperatura: float = 0.6, max_tokens: int = 8000):
+    """Chama a API Generative AI em modo streaming, produzindo o texto à medida que é gerado."""
+    try:
+        response = await _gerar_conteudo(prompt, temperatura, max_tokens, stream=True)
+        try:
+            async for chunk in response:
+                if chunk.parts:
+                    yield chunk.text
+        finally:
+            # O stream ocupa sua vaga no semáforo até ser todo consumido (ou abandonado pelo cliente)
+            _GEMINI_SEM.release()
+    except Exception as e:
+        logger.error("Erro ao chamar a API Gemini (streaming): %s", e)
+        raise
+
+# Cache LRU com TTL das análises de vaga: chave -> (expira_em, resultado)
+_cache_vagas: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
+
+def _chave_cache_vaga(descricao_vaga: str) -> str:
+    """Gera a chave do cache a partir da descrição normalizada (minúsculas, espaços colapsados)."""
+    normalizada = " ".join(descricao_vaga.lower().split())
+    return hashlib.blake2b(normalizada.encode("utf-8"), digest_size=16).hexdigest()
+
+
 async def analisar_vaga_ia(descricao_vaga: str) -> dict:
+    """Usa a IA para extrair informações da descrição da vaga, reaproveitando análises recentes."""
+    chave = _chave_cache_vaga(descricao_vaga)
+    agora = time.monotonic()
+
+    entrada = _cache_vagas.get(chave)
+    if entrada is not None:
+        expira_em, resultado = entrada
+        if expira_em > agora:
+            _cache_vagas.move_to_end(chave)
+            logger.info("Cache de análise de vaga", extra={"cache": "hit", "chave": chave})
+            return dict(resultado)
+        del _cache_vagas[chave]
+
+    logger.info("Cache de análise de vaga", extra={"cache": "miss", "chave": chave})
+    resultado = await _analisar_vaga_ia(descricao_vaga)
+
+    # Falhas não são cacheadas para que a próxima chamada tente novamente
+    if VAGA_CACHE_MAXSIZE > 0 and isinstance(resultado, dict) and not resultado.get("error"):
+        _cache_vagas[chave] = (agora + VAGA_CACHE_TTL, resultado)
+        _cache_vagas.move_to_end(chave)
+        while len(_cache_vagas) > VAGA_CACHE_MAXSIZE:
+            _cache_vagas.popitem(last=False)
+        return dict(resultado)
+    return resultado
+
+
+async def analisar_vagas_batch_ia(descricoes: list[str]) -> list[dict]:
+    """Analisa várias descrições de vaga em paralelo, preservando a ordem de entrada.
+
+    Descrições equivalentes (mesma chave de cache) geram uma única chamada à IA.
+    Itens que esbarram na cota esperam ela liberar (até BATCH_QUOTA_WAIT_MAX), já que o lote roda em segundo plano.
+    Falhas individuais são devolvidas como {"error": ...} sem interromper o lote.
+    """
+    tarefas = {}
+    chaves = []
+    for descricao in descricoes:
+        chave = _chave_cache_vaga(descricao)
+        chaves.append(chave)
+        if chave not in tarefas:
+            tarefas[chave] = _analisar_vaga_aguardando_cota(descricao)
+
+    resultados = await asyncio.gather(*tarefas.values(), return_exceptions=True)
+    por_chave = {}
+    for chave, resultado in zip(tarefas, resultados):
+        if isinstance(resultado, BaseException):
+            logger.error("Erro ao analisar vaga do lote: %s", resultado)
+            resultado = {"error": f"Erro inesperado: {resultado}"}
+        por_chave[chave] = resultado
+
+    return [dict(por_chave[chave]) if isinstance(por_chave[chave], dict) else por_chave[chave] for chave in chaves]
+
+
+async def _analisar_vaga_aguardando_cota(descricao_vaga: str) -> dict:
+    """Como analisar_vaga_ia, mas aguarda retry_after e tenta de novo em vez de falhar no limite de cota.
+
+    A espera total é limitada por BATCH_QUOTA_WAIT_MAX (uma cota diária esgotada não volta em minutos);
+    estourado o limite, o item é devolvido como {"error": ...}.
+    """
+    esperado = 0.0
+    while True:
+        try:
+            return await analisar_vaga_ia(descricao_vaga)
+        except GeminiRateLimitError as e:
+            espera = max(e.retry_after, GEMINI_BACKOFF_BASE)
+            if esperado + espera > BATCH_QUOTA_WAIT_MAX:
+                logger.warning("Item do lote desistiu de aguardar cota da API Gemini", extra={"esperado_s": round(esperado)})
+                return {"error": f"Cota da API Gemini não liberou após {esperado:.0f}s de espera. {e}"}
+            logger.info("Item do lote aguardando cota da API Gemini", extra={"espera_s": round(espera, 2)})
+            await asyncio.sleep(espera)
+            esperado += espera
+
+
+async def _analisar_vaga_ia(descricao_vaga: str) -> dict:
     """Usa a IA para extrair informações da descrição da vaga."""
-    prompt = (
-        "Você é um assistente especializado em análise de vagas. Extraia as seguintes informações da descrição da vaga fornecida: \n"
-        "- nomeEmpresa (string)\n"
-        "- nomenclaturaCargo (string)\n"
-        "- nivelExperiencia (string, ex: Júnior, Pleno, Sênior, Especialista)\n"
-        "- skillsTecnicas (lista de strings)\n"
-        "- softSkills (lista de strings)\n"
-        "- responsabilidadesDaVaga (lista de strings)\n"
-        "- tomDaVaga (string, ex: Formal, Informal, Corporativo)\n"
-        "- palavrasChave (lista de strings)\n\n"
-        "Retorne os dados estritamente como um objeto JSON válido, sem nenhum texto adicional antes ou depois.\n\n"
-        f"Descrição da vaga:\n{descricao_vaga}"
+    prompt = _VAGA_PROMPT_TEMPLATE.format(descricao_vaga=descricao_vaga)
+    # Temperatura baixa para mais objetividade; o modo JSON dispensa a extração do objeto na resposta
+    resposta_bruta = await chamar_agente_ia(
+        prompt, temperatura=0.3, max_tokens=1024, json_mode=True, response_schema=VagaInfoSchema
     )
-    resposta_bruta = await chamar_agente_ia(prompt, temperatura=0.3, max_tokens=2048) # Temperatura baixa para mais objetividade
 
     try:
-        # Tenta limpar especificamente para JSON antes de decodificar
-        json_match = re.search(r'\{.*\}', resposta_bruta, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)
-            return json.loads(json_str)
-        else:
-            # Se não encontrar um JSON claro, tenta decodificar a resposta limpa
-             return json.loads(resposta_bruta) # Pode falhar se não for JSON
+        # Em modo JSON a resposta já é o objeto; basta decodificar
+        try:
+            return _json_loads(resposta_bruta)
+        except json.JSONDecodeError:
+            pass
+
+        # Salvaguarda: extrai o objeto JSON caso venha cercado por texto adicional
+        json_str = _extrair_objeto_json(resposta_bruta)
+        if json_str is not None:
+            return _json_loads(json_str)
+        return _json_loads(resposta_bruta) # Falha com a mensagem original se não houver JSON
     except json.JSONDecodeError as e:
-        print(f"Erro ao decodificar JSON da análise da vaga: {e}")
-        print(f"Resposta bruta recebida: {resposta_bruta}")
+        logger.error("Erro ao decodificar JSON da análise da vaga: %s", e)
+        logger.error("Resposta bruta recebida: %s", resposta_bruta)
         # Retorna um dicionário indicando o erro e a resposta bruta
         return {"error": f"Falha ao decodificar JSON: {e}", "raw_response": resposta_bruta}
     except Exception as e:
-        print(f"Erro inesperado na análise da vaga: {e}")
+        logger.error("Erro inesperado na análise da vaga: %s", e)
         return {"error": f"Erro inesperado: {e}", "raw_response": resposta_bruta}
 
 
-async def gerar_texto_cv_ia(dados_usuario: dict, vaga_info: dict) -> str:
-    """Usa a IA para gerar o texto do currículo adaptado à vaga."""
-    if not dados_usuario or not vaga_info:
+async def gerar_texto_cv_ia(dados_usuario_json: str, vaga_info: dict) -> str:
+    """Usa a IA para gerar o texto do currículo adaptado à vaga.
+
+    dados_usuario_json já vem serializado (DadosUsuario.model_dump_json), evitando o dict intermediário.
+    """
+    if not dados_usuario_json or not vaga_info:
         raise ValueError("Os dados do usuário e da vaga são necessários para gerar o CV.")
 
-    # Convertendo os dicionários Pydantic para JSON strings formatadas para o prompt
-    dados_usuario_json = json.dumps(dados_usuario, indent=2, ensure_ascii=False)
-    vaga_info_json = json.dumps(vaga_info, indent=2, ensure_ascii=False)
+    prompt = _montar_prompt_cv(dados_usuario_json, vaga_info)
+    # Usar temperatura um pouco maior para criatividade na escrita, mas ainda contida
+    texto_cv = await chamar_agente_ia(prompt, temperatura=0.7, max_tokens=4096)
+    return texto_cv
 
-    prompt = f"""
-    Gere um currículo em texto puro e formatado para ATS (sem tabelas, colunas múltiplas ou imagens), baseado nas informações do usuário abaixo e adaptado para a vaga fornecida. Use uma estrutura profissional com seções como Contato, Endereço, Objetivo, Experiência Profissional, Projetos, Formação Acadêmica e Habilidades, tudo de acordo com os dados do usuário.
-    Certifique-se de utilizar os dados reais fornecidos pelo usuário (telefone, email, LinkedIn etc.) no currículo, sem substituí-los por placeholders genéricos como [Seu Email].
-    O objetivo deve ser conciso e direcionado para a vaga, evitando textos genéricos.
-    Na seção de Habilidades, liste as habilidades técnicas e interpessoais relevantes do usuário, priorizando aquelas mencionadas na descrição da vaga. Se a vaga pedir tecnologias que o usuário domina (conforme a lista fixa abaixo), liste-as. Se pedir outras, mencione 'Interesse em aprender [tecnologia]'.
 
-    Tecnologias que o usuário domina: Javascript, HTML, CSS, Bootstrap, React, Vue.js, Node.js, Python, Flask, Streamlit, Java, Spring Boot, SQL. As demais tecnologias mencionadas na vaga deve constar como: Interesse em aprender [tecnologia].
+def gerar_texto_cv_ia_stream(dados_usuario_json: str, vaga_info: dict):
+    """Versão em streaming de gerar_texto_cv_ia: devolve um gerador assíncrono com o texto em partes.
 
-    Dados do usuário:
-    {dados_usuario_json}
+    A validação (dados e tamanho do prompt) ocorre já na chamada, antes de qualquer parte ser enviada.
+    """
+    if not dados_usuario_json or not vaga_info:
+        raise ValueError("Os dados do usuário e da vaga são necessários para gerar o CV.")
 
-    Informações da vaga:
-    {vaga_info_json}
+    prompt = _montar_prompt_cv(dados_usuario_json, vaga_info)
+    return chamar_agente_ia_stream(prompt, temperatura=0.7, max_tokens=4096)
 
-    Retorne apenas o texto completo do currículo, começando pelo nome do candidato, formatado de forma clara e profissional, sem explicações adicionais, introduções, despedidas ou blocos de código Markdown. Siga a estrutura padrão de currículos ATS.
+
+def verificar_tamanho_dados_usuario(dados_usuario_json: str):
+    """Levanta PromptMuitoGrandeError se só os dados do usuário já estouram GEMINI_INPUT_TOKEN_LIMIT.
+
+    Chamada antes de analisar a vaga, para não gastar uma chamada à IA num pedido que terminaria em 413.
     """
-    # Usar temperatura um pouco maior para criatividade na escrita, mas ainda contida
-    texto_cv = await chamar_agente_ia(prompt, temperatura=0.7, max_tokens=4096)
-    return texto_cv
+    tokens_estimados = _estimar_tokens(_CV_PROMPT_TEMPLATE) + _estimar_tokens(dados_usuario_json)
+    if tokens_estimados > GEMINI_INPUT_TOKEN_LIMIT:
+        raise PromptMuitoGrandeError(tokens_estimados)
+
+
+def _montar_prompt_cv(dados_usuario_json: str, vaga_info: dict) -> str:
+    """Monta o prompt de geração do currículo a partir dos dados do usuário e da vaga."""
+    # Convertendo as informações da vaga para JSON string formatada para o prompt
+    vaga_info_json = _json_dumps(vaga_info)
+    # Vinda direto da IA, a análise não é validada: só uma lista é tratada como lista de skills
+    skills_vaga = vaga_info.get("skillsTecnicas")
+    dominadas, aprender = _classificar_skills(skills_vaga if isinstance(skills_vaga, list) else [])
+
+    prompt = _CV_PROMPT_TEMPLATE.format(
+        dados=dados_usuario_json,
+        vaga=vaga_info_json,
+        dominadas=", ".join(dominadas) or "nenhuma",
+        aprender=", ".join(aprender) or "nenhuma",
+    )
+
+    # Rejeita entradas patológicas antes de gastar uma chamada que o Gemini truncaria ou recusaria
+    tokens_estimados = _estimar_tokens(prompt)
+    if tokens_estimados > GEMINI_INPUT_TOKEN_LIMIT:
+        raise PromptMuitoGrandeError(tokens_estimados)
+    return prompt
+
+
+def _classificar_skills(skills_vaga: list[str]) -> tuple[list[str], list[str]]:
+    """Separa as skills da vaga entre as que o usuário domina e as que ele tem interesse em aprender.
+
+    A comparação usa _normalizar_skill (ignora maiúsculas, sufixo JS, versões e separadores) e a ordem
+    da vaga é preservada, sem repetições.
+    """
+    dominadas, aprender, vistas = [], [], set()
+    for skill in skills_vaga:
+        if not isinstance(skill, str) or not skill.strip():
+            continue
+        chave = _normalizar_skill(skill)
+        dominada = _TECNOLOGIAS_POR_CHAVE.get(chave)
+        # Grafias da mesma tecnologia (ex.: 'JS' e 'JavaScript') contam uma vez só
+        marca = dominada or chave
+        if marca in vistas:
+            continue
+        vistas.add(marca)
+        if dominada:
+            dominadas.append(dominada)
+        else:
+            aprender.append(skill.strip())
+    return dominadas, aprender
@@ -0,0 +1,47 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Atributos padrão de LogRecord; o que sobrar veio de extra={...} e é anexado à mensagem
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class _FormatadorEstruturado(logging.Formatter):
+    """Formata a mensagem e acrescenta os campos de extra={...} como chave=valor."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        texto = super().format(record)
+        campos = {k: v for k, v in vars(record).items() if k not in _ATRIBUTOS_PADRAO}
+        if campos:
+            texto += " " + " ".join(f"{k}={v}" for k, v in campos.items())
+        return texto
+
+
+def configurar_logging():
+    """Envia os logs do pacote 'app' por uma fila, deixando a escrita em stdout para uma thread separada.
+
+    Assim o event loop só enfileira o registro e nunca bloqueia em I/O. Chamadas repetidas não têm efeito.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(_FormatadorEstruturado("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    fila: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(logging.handlers.QueueHandler(fila))
+    logger.propagate = False
@@ -1,16 +1,29 @@
 from fastapi import FastAPI, HTTPException, Depends, Body
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import ValidationError
+import asyncio
 import json
-from typing import Annotated
+import logging
+import uuid
+from urllib.parse import quote
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Annotated, List
 
 # Importações dos módulos locais
 from .models.schemas import (
-    DadosUsuario, VagaDescricaoInput, VagaInfoOutput, GerarCVInput
+    DadosUsuario, VagaDescricaoInput, VagaInfoOutput, GerarCVInput, BatchJobOutput, MAX_VAGAS_BATCH
 )
-from .core.ai import analisar_vaga_ia, gerar_texto_cv_ia
-from .services.cv_generator import criar_pdf_ats_formatado
+from .core.ai import (
+    GeminiRateLimitError, PromptMuitoGrandeError, analisar_vaga_ia, analisar_vagas_batch_ia, gerar_texto_cv_ia, gerar_texto_cv_ia_stream,
+    verificar_tamanho_dados_usuario
+)
+from .core.log import configurar_logging
+from .services.cv_generator import criar_pdf_ats_formatado_async, encerrar_pool
+
+configurar_logging()
+logger = logging.getLogger(__name__)
 
 # Descrição da API para Swagger
 description = """
@@ -23,6 +36,14 @@ Esta API permite:
 Utiliza Google Gemini para processamento de linguagem natural e ReportLab para geração de PDF.
 """
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Encerra os processos de geração de PDF junto com a aplicação
+    await asyncio.to_thread(encerrar_pool)
+
+
 app = FastAPI(
     title="Gerador de Currículo ATS API",
     description=description,
@@ -31,12 +52,13 @@ app = FastAPI(
         "name": "Jean Oliveira",
         "email": "jeanolivera123@gmail.com",
     },
+    lifespan=lifespan,
 )
 
 # --- CORS CONFIG ---
 origins = [
     "http://localhost",
-    "http://localhost:5500"
+    "http://localhost:5500",
     "http://localhost:3000",
     "http://localhost:5173",      
     "http://127.0.0.1:3000",
@@ -53,6 +75,112 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Exemplo de payload exibido na documentação de /gerar-curriculo-pdf
+_CV_EXAMPLE = {
+    "dados_usuario": {
+        "nomeCompleto": "João da Silva",
+        "endereco": {"cidade": "São Paulo", "estado": "SP"},
+        "contato": {
+            "telefone": "11999998888",
+            "email": "joao.silva@email.com",
+            "linkedIn": "https://linkedin.com/in/joaosilva",
+            "gitHub": "https://github.com/joaosilva"
+        },
+        "experiencia": [
+            {
+                "cargo": "Desenvolvedor Full Stack",
+                "empresa": "Tech Solutions",
+                "periodo": "Jan 2020 - Atual",
+                "descricao": "Desenvolvimento e manutenção de aplicações web usando React, Node.js e PostgreSQL. Liderança técnica em projetos."
+            }
+        ],
+        "projetos": [
+            {
+                "titulo": "Sistema de E-commerce",
+                "tecnologias": ["React", "Node.js", "MongoDB"],
+                "descricao": "Plataforma completa de e-commerce com carrinho, pagamento e área administrativa."
+            }
+        ],
+        "educacao": [
+            {
+                "curso": "Ciência da Computação",
+                "instituicao": "Universidade Exemplo",
+                "periodo": "2016 - 2020"
+            }
+        ]
+    },
+    "descricao_vaga": "Procuramos Desenvolvedor Python Pleno com experiência em FastAPI e AWS..."
+}
+
+
+# --- Funções auxiliares ---
+
+async def _obter_vaga_info(payload: GerarCVInput) -> dict:
+    """Resolve as informações da vaga: usa vaga_info fornecido ou analisa descricao_vaga com IA."""
+    if payload.descricao_vaga and not payload.vaga_info:
+        logger.info("Analisando descrição da vaga para gerar CV...")
+        vaga_info_dict = await analisar_vaga_ia(payload.descricao_vaga)
+        if isinstance(vaga_info_dict, dict) and vaga_info_dict.get("error"):
+            raise HTTPException(status_code=400, detail=f"Erro ao analisar a vaga antes de gerar o CV: {vaga_info_dict['error']}")
+        return vaga_info_dict
+    elif payload.vaga_info:
+        logger.info("Usando vaga_info pré-fornecido para gerar CV...")
+        return payload.vaga_info.model_dump(exclude_none=True)
+    else:
+        raise HTTPException(status_code=400, detail="Faltam informações da vaga.")
+
+
+def _erro_rate_limit(e: GeminiRateLimitError) -> HTTPException:
+    """Converte o esgotamento de cota da IA em 429 estruturado, com Retry-After."""
+    retry_after = max(int(e.retry_after + 0.999), 1)
+    return HTTPException(
+        status_code=429,
+        detail={"error": "rate_limited", "retry_after": retry_after, "message": str(e)},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _para_vaga_info_output(resultado_analise) -> VagaInfoOutput:
+    """Converte o resultado bruto da análise de vaga no modelo de resposta, registrando falhas."""
+    if isinstance(resultado_analise, dict) and resultado_analise.get("error"):
+        return VagaInfoOutput(
+            error=resultado_analise.get("error"),
+            raw_analysis=resultado_analise
+        )
+
+    try:
+        vaga_info = VagaInfoOutput(**resultado_analise)
+        return vaga_info
+    except (ValidationError, TypeError) as e:
+        logger.error("Erro de validação Pydantic após análise IA: %s", e)
+        return VagaInfoOutput(
+            error=f"IA retornou dados em formato inesperado: {e}",
+            raw_analysis=resultado_analise if isinstance(resultado_analise, dict) else None
+        )
+
+
+# Lotes de análise de vaga em memória: job_id -> BatchJobOutput (mantém os mais recentes)
+MAX_BATCH_JOBS = 256
+_batch_jobs: "OrderedDict[str, BatchJobOutput]" = OrderedDict()
+# Tarefa em andamento de cada lote: job_id -> asyncio.Task (cancelada se o lote for descartado)
+_batch_tasks: "dict[str, asyncio.Task]" = {}
+
+
+async def _executar_batch(job_id: str, descricoes: List[str]):
+    """Processa um lote de análises de vaga e grava o resultado no job correspondente."""
+    job = _batch_jobs.get(job_id)
+    try:
+        resultados = await analisar_vagas_batch_ia(descricoes)
+        if job is not None:
+            job.resultados = [_para_vaga_info_output(r) for r in resultados]
+            job.status = "concluido"
+    except Exception as e:
+        logger.error("Erro interno ao processar lote %s: %s", job_id, e)
+        if job is not None:
+            job.status = "erro"
+            job.error = str(e)
+
+
 # --- Endpoints da API ---
 
 @app.post(
@@ -63,7 +191,7 @@ app.add_middleware(
     description="Recebe a descrição de uma vaga e utiliza IA para extrair dados estruturados como nome da empresa, cargo, skills, etc.",
 )
 async def analisar_vaga_endpoint(
-    vaga_input: VagaDescricaoInput = Body(..., embed=True, description="Objeto contendo a descrição da vaga a ser analisada.")
+    vaga_input: VagaDescricaoInput = Body(..., description="Objeto contendo a descrição da vaga a ser analisada.")
 ):
     if not vaga_input.descricao_vaga.strip():
         raise HTTPException(status_code=400, detail="A descrição da vaga não pode estar vazia.")
@@ -71,125 +199,192 @@ async def analisar_vaga_endpoint(
     try:
         resultado_analise = await analisar_vaga_ia(vaga_input.descricao_vaga)
 
-        if isinstance(resultado_analise, dict) and resultado_analise.get("error"):
-            return VagaInfoOutput(
-                error=resultado_analise.get("error"),
-                raw_analysis=resultado_analise
-            )
-
-        try:
-            vaga_info = VagaInfoOutput(**resultado_analise)
-            return vaga_info
-        except ValidationError as e:
-            print(f"Erro de validação Pydantic após análise IA: {e}")
-            return VagaInfoOutput(
-                error=f"IA retornou dados em formato inesperado: {e}",
-                raw_analysis=resultado_analise
-            )
+        return _para_vaga_info_output(resultado_analise)
 
+    except GeminiRateLimitError as e:
+        raise _erro_rate_limit(e)
     except Exception as e:
-        print(f"Erro interno ao analisar vaga: {e}")
+        logger.error("Erro interno ao analisar vaga: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor ao analisar a vaga: {str(e)}")
 
 
+@app.post(
+    "/analisar-vagas-batch",
+    response_model=BatchJobOutput,
+    status_code=202,
+    tags=["Análise de Vaga"],
+    summary="Agenda a análise de várias descrições de vaga",
+    description="Recebe uma lista de descrições de vaga e as analisa em segundo plano. Retorna um job_id para consulta em /batch-status/{job_id}.",
+)
+async def analisar_vagas_batch_endpoint(
+    vagas_input: List[VagaDescricaoInput] = Body(
+        ...,
+        max_length=MAX_VAGAS_BATCH,
+        description=f"Lista de objetos contendo as descrições das vagas (até {MAX_VAGAS_BATCH})."
+    )
+):
+    if not vagas_input:
+        raise HTTPException(status_code=400, detail="A lista de vagas não pode estar vazia.")
+    if any(not v.descricao_vaga.strip() for v in vagas_input):
+        raise HTTPException(status_code=400, detail="A descrição da vaga não pode estar vazia.")
+
+    job_id = uuid.uuid4().hex
+    job = BatchJobOutput(job_id=job_id, status="processando", total=len(vagas_input))
+    _batch_jobs[job_id] = job
+    while len(_batch_jobs) > MAX_BATCH_JOBS:
+        descartado, _ = _batch_jobs.popitem(last=False)
+        # Ninguém mais consegue consultar o lote descartado: não vale seguir chamando a IA por ele
+        tarefa_descartada = _batch_tasks.pop(descartado, None)
+        if tarefa_descartada is not None:
+            tarefa_descartada.cancel()
+
+    tarefa = asyncio.create_task(_executar_batch(job_id, [v.descricao_vaga for v in vagas_input]))
+    _batch_tasks[job_id] = tarefa
+    tarefa.add_done_callback(lambda _: _batch_tasks.pop(job_id, None))
+    return job
+
+
+@app.get(
+    "/batch-status/{job_id}",
+    response_model=BatchJobOutput,
+    tags=["Análise de Vaga"],
+    summary="Consulta o andamento de um lote de análises de vaga",
+    description="Retorna o status do lote e, quando concluído, as análises na mesma ordem das descrições enviadas.",
+)
+async def batch_status_endpoint(job_id: str):
+    job = _batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lote não encontrado.")
+    return job
+
+
 @app.post(
     "/gerar-curriculo-pdf",
     tags=["Geração de Currículo"],
     summary="Gera um currículo em PDF otimizado para ATS",
     description="Recebe os dados do usuário e a descrição da vaga (ou análise prévia), gera o texto do CV com IA e o converte para PDF.",
-    response_class=StreamingResponse,
+    response_class=Response,
     responses={
         200: {
             "description": "Currículo em PDF gerado com sucesso.",
             "content": {"application/pdf": {}},
         },
         400: {"description": "Dados de entrada inválidos."},
+        413: {"description": "Dados do usuário e da vaga grandes demais para a IA."},
         500: {"description": "Erro interno do servidor durante a geração."},
     }
 )
 async def gerar_curriculo_pdf_endpoint(
     payload: Annotated[GerarCVInput, Body(
         description="Dados do usuário e informações da vaga para gerar o currículo.",
-        examples=[
-            {
-                "dados_usuario": {
-                    "nomeCompleto": "João da Silva",
-                    "endereco": {"cidade": "São Paulo", "estado": "SP"},
-                    "contato": {
-                        "telefone": "11999998888",
-                        "email": "joao.silva@email.com",
-                        "linkedIn": "https://linkedin.com/in/joaosilva",
-                        "gitHub": "https://github.com/joaosilva"
-                    },
-                    "experiencia": [
-                        {
-                            "cargo": "Desenvolvedor Full Stack",
-                            "empresa": "Tech Solutions",
-                            "periodo": "Jan 2020 - Atual",
-                            "descricao": "Desenvolvimento e manutenção de aplicações web usando React, Node.js e PostgreSQL. Liderança técnica em projetos."
-                        }
-                    ],
-                    "projetos": [
-                        {
-                            "titulo": "Sistema de E-commerce",
-                            "tecnologias": ["React", "Node.js", "MongoDB"],
-                            "descricao": "Plataforma completa de e-commerce com carrinho, pagamento e área administrativa."
-                        }
-                    ],
-                    "educacao": [
-                        {
-                            "curso": "Ciência da Computação",
-                            "instituicao": "Universidade Exemplo",
-                            "periodo": "2016 - 2020"
-                        }
-                    ]
-                },
-                "descricao_vaga": "Procuramos Desenvolvedor Python Pleno com experiência em FastAPI e AWS..."
-            }
-        ]
+        examples=[_CV_EXAMPLE]
     )]
 ):
-    dados_usuario_dict = payload.dados_usuario.model_dump()
-
     if not payload.descricao_vaga and not payload.vaga_info:
         raise HTTPException(status_code=400, detail="É necessário fornecer 'descricao_vaga' ou 'vaga_info'.")
 
-    vaga_info_dict = {}
     try:
-        if payload.descricao_vaga and not payload.vaga_info:
-            print("Analisando descrição da vaga para gerar CV...")
-            vaga_info_dict = await analisar_vaga_ia(payload.descricao_vaga)
-            if isinstance(vaga_info_dict, dict) and vaga_info_dict.get("error"):
-                raise HTTPException(status_code=400, detail=f"Erro ao analisar a vaga antes de gerar o CV: {vaga_info_dict['error']}")
-        elif payload.vaga_info:
-            print("Usando vaga_info pré-fornecido para gerar CV...")
-            vaga_info_dict = payload.vaga_info.model_dump(exclude_none=True)
-        else:
-            raise HTTPException(status_code=400, detail="Faltam informações da vaga.")
-
-        print("Gerando texto do CV com IA...")
-        texto_cv = await gerar_texto_cv_ia(dados_usuario_dict, vaga_info_dict)
+        # Serializa os dados do usuário direto para JSON (sem dict intermediário) e rejeita dados grandes
+        # demais antes de gastar a chamada de análise da vaga
+        dados_usuario_json = payload.dados_usuario.model_dump_json(indent=2)
+        verificar_tamanho_dados_usuario(dados_usuario_json)
+        vaga_info_dict = await _obter_vaga_info(payload)
+
+        logger.info("Gerando texto do CV com IA...")
+        texto_cv = await gerar_texto_cv_ia(dados_usuario_json, vaga_info_dict)
 
         if not texto_cv or not texto_cv.strip():
             raise HTTPException(status_code=500, detail="A IA não retornou conteúdo para o currículo.")
 
-        print("Gerando arquivo PDF...")
-        nome_candidato = dados_usuario_dict.get("nomeCompleto", "Candidato")
-        pdf_buffer = criar_pdf_ats_formatado(texto_cv, nome_candidato)
+        logger.info("Gerando arquivo PDF...")
+        nome_candidato = payload.dados_usuario.nomeCompleto or "Candidato"
+        # ReportLab é CPU-bound: renderiza em outro processo para não bloquear o event loop nem disputar o GIL
+        pdf_buffer = await criar_pdf_ats_formatado_async(texto_cv, nome_candidato)
 
-        filename = f"CV_{nome_candidato.replace(' ', '_')}_ATS.pdf"
-        return StreamingResponse(
-            pdf_buffer,
+        # Nomes com acentos vão no filename* (RFC 5987); filename ASCII fica como alternativa
+        nome_arquivo = quote(f"CV_{nome_candidato.replace(' ', '_')}_ATS.pdf", safe="")
+        # O PDF já está todo em memória: envia em uma única resposta, sem iterar o buffer
+        return Response(
+            content=pdf_buffer.getvalue(),
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={"Content-Disposition": f"attachment; filename=CV_ATS.pdf; filename*=UTF-8''{nome_arquivo}"}
         )
 
     except HTTPException as http_exc:
         raise http_exc
+    except PromptMuitoGrandeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except GeminiRateLimitError as e:
+        raise _erro_rate_limit(e)
+    except Exception as e:
+        logger.error("Erro interno ao gerar currículo PDF: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro interno do servidor ao gerar o currículo: {str(e)}")
+
+
+@app.post(
+    "/gerar-curriculo-texto/stream",
+    tags=["Geração de Currículo"],
+    summary="Gera o texto do currículo em streaming (Server-Sent Events)",
+    description="Recebe os mesmos dados de /gerar-curriculo-pdf e envia o texto do CV à medida que a IA o gera, como eventos SSE no formato `data: {\"token\": \"...\"}`. O fim é sinalizado por `event: end` e falhas por `event: error`.",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "Fluxo de eventos com o texto do currículo.",
+            "content": {"text/event-stream": {}},
+        },
+        400: {"description": "Dados de entrada inválidos."},
+        413: {"description": "Dados do usuário e da vaga grandes demais para a IA."},
+        500: {"description": "Erro interno do servidor durante a geração."},
+    }
+)
+async def gerar_curriculo_texto_stream_endpoint(
+    payload: Annotated[GerarCVInput, Body(
+        description="Dados do usuário e informações da vaga para gerar o currículo.",
+        examples=[_CV_EXAMPLE]
+    )]
+):
+    if not payload.descricao_vaga and not payload.vaga_info:
+        raise HTTPException(status_code=400, detail="É necessário fornecer 'descricao_vaga' ou 'vaga_info'.")
+
+    dados_usuario_json = payload.dados_usuario.model_dump_json(indent=2)
+    try:
+        verificar_tamanho_dados_usuario(dados_usuario_json)
+        vaga_info_dict = await _obter_vaga_info(payload)
+    except HTTPException as http_exc:
+        raise http_exc
+    except PromptMuitoGrandeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except GeminiRateLimitError as e:
+        raise _erro_rate_limit(e)
+    except Exception as e:
+        logger.error("Erro interno ao analisar vaga para streaming: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro interno do servidor ao gerar o currículo: {str(e)}")
+
+    try:
+        trechos = gerar_texto_cv_ia_stream(dados_usuario_json, vaga_info_dict)
+    except PromptMuitoGrandeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Erro interno ao gerar currículo PDF: {e}")
+        logger.error("Erro interno ao preparar o streaming do currículo: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor ao gerar o currículo: {str(e)}")
 
+    async def sse_generator():
+        try:
+            async for trecho in trechos:
+                yield f"data: {json.dumps({'token': trecho}, ensure_ascii=False)}\n\n"
+            yield "event: end\ndata: {}\n\n"
+        except Exception as e:
+            logger.error("Erro durante o streaming do currículo: %s", e)
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        sse_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 if __name__ == "__main__":
     import uvicorn
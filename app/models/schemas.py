@@ -1,6 +1,7 @@
 
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
+from typing_extensions import TypedDict
 
 class Contato(BaseModel):
     telefone: Optional[str] = Field(None, description="Número de telefone do usuário")
@@ -37,8 +38,26 @@ class DadosUsuario(BaseModel):
     educacao: List[Educacao] = Field(default_factory=list)
     # Adicione outros campos se necessário (ex: Habilidades, Idiomas)
 
+# Limite da descrição da vaga: textos maiores são rejeitados na validação, antes de chegar à IA
+MAX_DESCRICAO_VAGA = 20000
+# Limite de descrições por lote em /analisar-vagas-batch
+MAX_VAGAS_BATCH = 50
+
 class VagaDescricaoInput(BaseModel):
-    descricao_vaga: str = Field(..., description="Descrição completa da vaga de emprego")
+    descricao_vaga: str = Field(..., max_length=MAX_DESCRICAO_VAGA, description="Descrição completa da vaga de emprego")
+
+# Formato da análise de vaga enviado ao Gemini como response_schema no modo JSON. O SDK não aceita
+# campos com default/Optional no schema, por isso é um TypedDict (chaves opcionais, sem defaults);
+# mantenha os campos em sincronia com VagaInfoOutput
+class VagaInfoSchema(TypedDict, total=False):
+    nomeEmpresa: str
+    nomenclaturaCargo: str
+    nivelExperiencia: str
+    skillsTecnicas: List[str]
+    softSkills: List[str]
+    responsabilidadesDaVaga: List[str]
+    tomDaVaga: str
+    palavrasChave: List[str]
 
 class VagaInfoOutput(BaseModel):
     # Os campos exatos podem variar dependendo do que a IA retorna
@@ -59,4 +78,12 @@ class VagaInfoOutput(BaseModel):
 class GerarCVInput(BaseModel):
     dados_usuario: DadosUsuario = Field(..., description="Informações completas do perfil do usuário")
     vaga_info: Optional[VagaInfoOutput] = Field(None, description="Informações analisadas da vaga (opcional, pode usar descricao_vaga)")
-    descricao_vaga: Optional[str] = Field(None, description="Descrição da vaga (usado se vaga_info não for fornecido)")
+    descricao_vaga: Optional[str] = Field(None, max_length=MAX_DESCRICAO_VAGA, description="Descrição da vaga (usado se vaga_info não for fornecido)")
+
+
+class BatchJobOutput(BaseModel):
+    job_id: str = Field(..., description="Identificador do lote para consulta em /batch-status/{job_id}")
+    status: str = Field(..., description="Situação do lote: 'processando', 'concluido' ou 'erro'")
+    total: int = Field(..., description="Quantidade de descrições de vaga no lote")
+    resultados: Optional[List[VagaInfoOutput]] = Field(None, description="Análises na mesma ordem da entrada, quando concluído")
+    error: Optional[str] = Field(None, description="Mensagem de erro se o lote falhar")
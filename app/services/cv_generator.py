@@ -2,183 +2,451 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch, cm
 from io import BytesIO
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, HRFlowable, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
 from reportlab.lib import colors
-import re
+from reportlab.lib.fonts import ps2tt, tt2ps
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus.paragraph import cleanBlockQuotedText
+from reportlab.platypus.paraparser import ParaFrag
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Optional
+import asyncio
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
 
 # Configurações globais
-styles = getSampleStyleSheet()
+# Cada worker carrega o ReportLab inteiro: o padrão é limitado para caber em hosts com pouca RAM
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS") or min(os.cpu_count() or 1, 2))
 MARGEM = 1.8*cm
+MARGEM_TOPO = 1.2*cm
+
+# Espaçamentos em pontos, calculados uma única vez
+ESPACO_01CM = 0.1*cm
+ESPACO_02CM = 0.2*cm
+ESPACO_03CM = 0.3*cm
+ESPACO_04CM = 0.4*cm
+ESPACO_06CM = 0.6*cm
+ESPACO_07CM = 0.7*cm
+
+# Espaço antes de cada título de seção; o Spacer é imutável e pode ser reaproveitado
+_SPACER_SECAO = Spacer(1, ESPACO_03CM)
 COR_PRIMARIA = "#2B3A4B"
 COR_SECUNDARIA = "#4A6FA5"
 COR_TEXTO = "#333333"
 
+# Cores já convertidas, compartilhadas pelos estilos e pelo cabeçalho
+_C_PRIMARIA = colors.HexColor(COR_PRIMARIA)
+_C_SECUNDARIA = colors.HexColor(COR_SECUNDARIA)
+_C_TEXTO = colors.HexColor(COR_TEXTO)
+_C_CONTATO = colors.HexColor("#555555")
+_C_DETALHE = colors.HexColor("#666666")
+_C_DIVISOR = colors.HexColor("#E0E0E0")
+
+
 # ================= ESTILOS =================
-estilo_nome = ParagraphStyle(
-    name='Nome',
-    parent=styles['Heading1'],
-    fontSize=24,
-    leading=28,
-    alignment=TA_CENTER,
-    spaceAfter=0.4*cm,
-    fontName="Helvetica-Bold",
-    textColor=colors.HexColor(COR_PRIMARIA)
-)
-
-estilo_contato = ParagraphStyle(
-    name='Contato',
-    parent=styles['Normal'],
-    fontSize=9.5,
-    leading=12,
-    alignment=TA_CENTER,
-    spaceAfter=0.6*cm,
-    textColor=colors.HexColor("#555555")
-)
-
-estilo_titulo_secao = ParagraphStyle(
-    name='TituloSecao',
-    parent=styles['Heading2'],
-    fontSize=12,
-    leading=14,
-    spaceBefore=0.7*cm,
-    spaceAfter=0.3*cm,
-    fontName="Helvetica-Bold",
-    textColor=colors.white,
-    backColor=colors.HexColor(COR_SECUNDARIA),
-    borderPadding=(0.2*cm, 0.3*cm),
-    alignment=TA_LEFT
-)
-
-estilo_item_lista = ParagraphStyle(
-    name='ItemLista',
-    parent=styles['Normal'],
-    fontSize=10.5,
-    leading=14,
-    leftIndent=0.4*cm,
-    bulletIndent=0.2*cm,
-    spaceBefore=0.1*cm,
-    spaceAfter=0.1*cm,
-    bulletFontName="Helvetica-Bold",
-    bulletFontSize=12,
-    bulletColor=colors.HexColor(COR_SECUNDARIA),
-    textColor=colors.HexColor(COR_TEXTO)
-)
-
-estilo_subtitulo = ParagraphStyle(
-    name='Subtitulo',
-    parent=styles['Normal'],
-    fontSize=11,
-    leading=13,
-    spaceAfter=0.1*cm,
-    fontName="Helvetica-Bold",
-    textColor=colors.HexColor(COR_PRIMARIA)
-)
-
-estilo_detalhe = ParagraphStyle(
-    name='Detalhe',
-    parent=styles['Normal'],
-    fontSize=10,
-    leading=12,
-    textColor=colors.HexColor("#666666"),
-    spaceAfter=0.4*cm
-)
-
-divisor_secao = HRFlowable(
-    width="100%",
-    color=colors.HexColor("#E0E0E0"),
-    thickness=0.8,
-    spaceBefore=0.4*cm,
-    spaceAfter=0.4*cm
-)
+Estilos = namedtuple('Estilos', 'nome contato titulo_secao item_lista subtitulo detalhe')
+
+
+@functools.lru_cache(maxsize=None)
+def obter_estilos():
+    """Cria os estilos na primeira geração de PDF (não no import) e os reutiliza nas seguintes."""
+    styles = getSampleStyleSheet()
+
+    estilo_nome = ParagraphStyle(
+        name='Nome',
+        parent=styles['Heading1'],
+        fontSize=24,
+        leading=28,
+        alignment=TA_CENTER,
+        spaceAfter=ESPACO_04CM,
+        fontName="Helvetica-Bold",
+        textColor=_C_PRIMARIA
+    )
+
+    estilo_contato = ParagraphStyle(
+        name='Contato',
+        parent=styles['Normal'],
+        fontSize=9.5,
+        leading=12,
+        alignment=TA_CENTER,
+        spaceAfter=ESPACO_06CM,
+        textColor=_C_CONTATO
+    )
+
+    estilo_titulo_secao = ParagraphStyle(
+        name='TituloSecao',
+        parent=styles['Heading2'],
+        fontSize=12,
+        leading=14,
+        spaceBefore=ESPACO_07CM,
+        spaceAfter=ESPACO_03CM,
+        fontName="Helvetica-Bold",
+        textColor=colors.white,
+        backColor=_C_SECUNDARIA,
+        borderPadding=(ESPACO_02CM, ESPACO_03CM),
+        alignment=TA_LEFT
+    )
+
+    estilo_item_lista = ParagraphStyle(
+        name='ItemLista',
+        parent=styles['Normal'],
+        fontSize=10.5,
+        leading=14,
+        leftIndent=ESPACO_04CM,
+        bulletIndent=ESPACO_02CM,
+        spaceBefore=ESPACO_01CM,
+        spaceAfter=ESPACO_01CM,
+        bulletFontName="Helvetica-Bold",
+        bulletFontSize=12,
+        bulletColor=_C_SECUNDARIA,
+        textColor=_C_TEXTO
+    )
+
+    estilo_subtitulo = ParagraphStyle(
+        name='Subtitulo',
+        parent=styles['Normal'],
+        fontSize=11,
+        leading=13,
+        spaceAfter=ESPACO_01CM,
+        fontName="Helvetica-Bold",
+        textColor=_C_PRIMARIA
+    )
+
+    estilo_detalhe = ParagraphStyle(
+        name='Detalhe',
+        parent=styles['Normal'],
+        fontSize=10,
+        leading=12,
+        textColor=_C_DETALHE,
+        spaceAfter=ESPACO_04CM
+    )
+
+    return Estilos(
+        nome=estilo_nome,
+        contato=estilo_contato,
+        titulo_secao=estilo_titulo_secao,
+        item_lista=estilo_item_lista,
+        subtitulo=estilo_subtitulo,
+        detalhe=estilo_detalhe,
+    )
 
 # ================= FUNÇÕES AUXILIARES =================
-def criar_tabela_contato(dados):
-    return Table([dados],
-               colWidths=[None]*len(dados),
-               style=TableStyle([
-                   ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-                   ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-                   ('TEXTCOLOR', (0,0), (-1,-1), colors.HexColor("#555555")),
-                   ('FONTSIZE', (0,0), (-1,-1), 9.5),
-                   ('LEADING', (0,0), (-1,-1), 11),
-                   ('BOTTOMPADDING', (0,0), (-1,-1), 2)
-               ]))
-
-def processar_linha(linha, elementos, contexto):
-    linha = linha.strip()
+def eh_titulo_secao(linha):
+    """Título de seção: linha em maiúsculas (letras e espaços) terminando em ':', ex. 'EXPERIÊNCIA:'."""
+    if len(linha) < 3 or not linha.endswith(':'):
+        return False
+    corpo = linha[:-1]
+    return corpo.replace(' ', '').isalpha() and corpo.isupper()
+
+# ================= CABEÇALHO =================
+# Nome, contatos e divisor têm posição fixa no topo da primeira página: são desenhados direto no
+# canvas e o frame só reserva a altura deles, sem passar pelo layout do Platypus
+_PADDING_FRAME = 6  # padding padrão do Frame do SimpleDocTemplate
+_FONTE_CONTATO = "Helvetica"
+_TAMANHO_CONTATO = 9.5
+_PADDING_CONTATO = (3, 6, 2)  # topo, laterais e base de cada contato (como nas células de uma Table)
+_ALTURA_CONTATOS = _PADDING_CONTATO[0] + 11 + _PADDING_CONTATO[2]
+_ESPESSURA_DIVISOR = 0.8
+
+
+def _espaco_cabecalho(estilos):
+    """Spacer que reserva no frame a altura do nome; cresce com _reservar_contatos."""
+    espaco = Spacer(1, estilos.nome.leading)
+    espaco.spaceAfter = estilos.nome.spaceAfter
+    return espaco
+
+
+def _reservar_contatos(espaco, contatos):
+    if contatos:
+        espaco.height += espaco.spaceAfter + _ALTURA_CONTATOS + ESPACO_04CM + _ESPESSURA_DIVISOR
+        espaco.spaceAfter = ESPACO_04CM
+
+
+def _desenhar_cabecalho(nome, contatos, canvas, doc):
+    """Callback onFirstPage: desenha o nome centralizado, os contatos lado a lado e o divisor."""
+    estilo = obter_estilos().nome
+    esquerda = doc.leftMargin + _PADDING_FRAME
+    largura = doc.width - 2 * _PADDING_FRAME
+    topo = doc.pagesize[1] - doc.topMargin - _PADDING_FRAME
+
+    canvas.saveState()
+    # Nomes longos diminuem a fonte para caber em uma linha
+    largura_nome = stringWidth(nome, estilo.fontName, estilo.fontSize)
+    tamanho = estilo.fontSize if largura_nome <= largura else estilo.fontSize * largura / largura_nome
+    canvas.setFont(estilo.fontName, tamanho)
+    canvas.setFillColor(estilo.textColor)
+    canvas.drawCentredString(esquerda + largura / 2, topo - estilo.fontSize, nome)
+
+    if contatos:
+        topo -= estilo.leading + estilo.spaceAfter
+        larguras = [stringWidth(c, _FONTE_CONTATO, _TAMANHO_CONTATO) + 2 * _PADDING_CONTATO[1] for c in contatos]
+        x = esquerda + (largura - sum(larguras)) / 2
+        base = topo - _PADDING_CONTATO[0] - _TAMANHO_CONTATO
+        canvas.setFont(_FONTE_CONTATO, _TAMANHO_CONTATO)
+        canvas.setFillColor(_C_CONTATO)
+        for contato, largura_contato in zip(contatos, larguras):
+            canvas.drawCentredString(x + largura_contato / 2, base, contato)
+            x += largura_contato
+
+        y = topo - _ALTURA_CONTATOS - ESPACO_04CM - _ESPESSURA_DIVISOR
+        canvas.setStrokeColor(_C_DIVISOR)
+        canvas.setLineWidth(_ESPESSURA_DIVISOR)
+        canvas.setLineCap(1)
+        canvas.line(esquerda, y, esquerda + largura, y)
+    canvas.restoreState()
+
+
+# Marcadores de item de lista aceitos no início da linha (todos de um caractere)
+_MARCADORES = frozenset('•-*')
+
+
+def _fragmentos_simples(texto, estilo):
+    """Monta os mesmos fragmentos que o ParaParser geraria para um texto sem marcação."""
+    texto = cleanBlockQuotedText(texto)
+    if not texto:
+        return []
+    frag = ParaFrag()
+    frag.rise = 0
+    frag.greek = 0
+    frag.link = []
+    nome_fonte, frag.bold, frag.italic = ps2tt(estilo.fontName)
+    frag.fontName = tt2ps(nome_fonte, frag.bold, frag.italic)
+    frag.fontSize = estilo.fontSize
+    frag.textColor = estilo.textColor
+    frag.us_lines = []
+    frag.__tag__ = 'para'
+    frag.text = texto
+    return [frag]
+
+
+@functools.lru_cache(maxsize=256)
+def _fragmentos(texto, estilo):
+    """Fragmentos já interpretados da marcação de um texto em um estilo (os estilos são únicos).
+
+    Linhas sem '<' nem '&' (quase todas num currículo) não passam pelo parser XML do ReportLab.
+    """
+    if '<' not in texto and '&' not in texto and not estilo.textTransform:
+        return _fragmentos_simples(texto, estilo)
+    return Paragraph(texto, estilo).frags
+
+
+def _paragrafo(texto, estilo, bulletText=None):
+    """Cria um Paragraph reaproveitando a interpretação da marcação de linhas repetidas.
+
+    Só os fragmentos (somente leitura no layout) são compartilhados; cada linha ganha seu próprio
+    Paragraph, já que wrap/split guardam estado na instância.
+    """
+    return Paragraph(texto, estilo, bulletText, frags=list(_fragmentos(texto, estilo)))
+
+
+def _juntar_detalhes(elementos, estilos):
+    """Troca cada sequência de linhas de detalhe (str) por um só Paragraph e remove os separadores (None).
+
+    Menos flowables significa menos trabalho de layout no ReportLab por linha do currículo.
+    """
+    resultado = []
+    for tipo, grupo in itertools.groupby(elementos, type):
+        if tipo is str:
+            resultado.append(_paragrafo('<br/>'.join(grupo), estilos.detalhe))
+        elif tipo is not type(None):
+            resultado.extend(grupo)
+    return resultado
+
+
+# Tipos de linha, definidos só pelo conteúdo (o contexto é tratado no despacho)
+LINHA_VAZIA, LINHA_SECAO, LINHA_ITEM, LINHA_DETALHE, LINHA_TEXTO = range(5)
+
+
+def classificar_linha(linha):
+    """Classifica uma linha já sem espaços nas pontas em um dos tipos LINHA_*."""
     if not linha:
-        return contexto
+        return LINHA_VAZIA
+    if eh_titulo_secao(linha):
+        return LINHA_SECAO
+    if linha[:1] in _MARCADORES:
+        return LINHA_ITEM
+    if '|' in linha:
+        return LINHA_DETALHE
+    return LINHA_TEXTO
+
+
+# Contextos após os quais uma linha com '|' é detalhe (empresa/datas)
+_CONTEXTOS_DETALHE = frozenset({'subtitulo', 'detalhe'})
+
+# Os tratadores recebem a linha já sem espaços nas pontas (o laço principal faz o único strip)
+# e o append já vinculado de elementos. Linhas de detalhe entram como str e linhas em branco
+# como None; _juntar_detalhes resolve os dois no fim
+
+
+def _linha_vazia(linha, append, contexto, estilos):
+    # Linha em branco separa blocos de detalhe
+    append(None)
+    return contexto
+
 
-    # Detecção de título de seção
-    if re.match(r"^[A-Z][A-Z\s]+:$", linha):
-        if elementos:
-            elementos.append(Spacer(1, 0.3*cm))
-        titulo = linha[:-1].strip()
-        elementos.append(Paragraph(titulo, estilo_titulo_secao))
-        return 'secao'
+def _linha_secao(linha, append, contexto, estilos):
+    # Sempre há algo antes (o espaço do cabeçalho), então o título sempre ganha o espaçamento
+    append(_SPACER_SECAO)
+    titulo = linha[:-1].rstrip()
+    append(_paragrafo(titulo, estilos.titulo_secao))
+    return 'secao'
 
-    # Detecção de subtítulo (cargo/formação)
+
+def _linha_item(linha, append, contexto, estilos):
+    # Logo após o título da seção, a primeira linha sem '•' é subtítulo (cargo/formação);
+    # aqui a linha já começa com um marcador, então basta olhar o primeiro caractere
+    if contexto == 'secao' and linha[0] != '•':
+        append(_paragrafo(linha, estilos.subtitulo))
+        return 'subtitulo'
+
+    # Detalhes (empresa/datas) têm prioridade sobre o marcador
+    if contexto in _CONTEXTOS_DETALHE and '|' in linha:
+        append(linha)
+        return 'detalhe'
+
+    # A linha já chega sem espaços nas pontas; só falta o espaço após o marcador
+    texto = linha[1:].lstrip()
+    append(_paragrafo(texto, estilos.item_lista, bulletText='•'))
+    return 'item'
+
+
+def _linha_detalhe(linha, append, contexto, estilos):
     if contexto == 'secao' and '•' not in linha:
-        elementos.append(Paragraph(linha, estilo_subtitulo))
+        append(_paragrafo(linha, estilos.subtitulo))
         return 'subtitulo'
 
-    # Detecção de detalhes (empresa/datas)
-    if contexto in ['subtitulo', 'detalhe'] and '|' in linha:
-        elementos.append(Paragraph(linha, estilo_detalhe))
+    # Detalhes (empresa/datas) logo após o subtítulo
+    if contexto in _CONTEXTOS_DETALHE:
+        append(linha)
         return 'detalhe'
 
-    # Detecção de itens com bullet points
-    if linha.startswith(('•', '-', '*')):
-        texto = linha[1:].strip()
-        elementos.append(Paragraph(texto, estilo_item_lista, bulletText='•'))
-        return 'item'
+    append(linha)
+    return 'texto'
+
 
-    # Texto normal
-    elementos.append(Paragraph(linha, estilo_detalhe))
+def _linha_texto(linha, append, contexto, estilos):
+    if contexto == 'secao' and '•' not in linha:
+        append(_paragrafo(linha, estilos.subtitulo))
+        return 'subtitulo'
+
+    append(linha)
     return 'texto'
 
+
+# Tratador de cada tipo de linha, indexado por LINHA_*; cada um devolve o novo contexto
+_TRATADORES = (_linha_vazia, _linha_secao, _linha_item, _linha_detalhe, _linha_texto)
+
 # ================= FUNÇÃO PRINCIPAL =================
-def criar_pdf_ats_formatado(texto_cv: str, nome_candidato: str) -> BytesIO:
-    buffer = BytesIO()
+def criar_pdf_ats_formatado(texto_cv: str, nome_candidato: str, output: Optional[BinaryIO] = None) -> BinaryIO:
+    """Gera o PDF do currículo e o devolve em um BytesIO posicionado no início.
+
+    Com `output` (qualquer arquivo binário gravável), o PDF é escrito direto nele, sem cópia em memória.
+    """
+    buffer = BytesIO() if output is None else output
     doc = SimpleDocTemplate(
         buffer,
         pagesize=A4,
         rightMargin=MARGEM,
         leftMargin=MARGEM,
-        topMargin=1.2*cm,
+        topMargin=MARGEM_TOPO,
         bottomMargin=MARGEM,
         title=f"CV - {nome_candidato}",
         author="Gerador de CV ATS"
     )
 
+    estilos = obter_estilos()
     elementos = []
-    linhas = texto_cv.split('\n')
+    linhas = iter(texto_cv.splitlines())
+    # A primeira linha do texto é o nome, que vem de nome_candidato
+    next(linhas, None)
 
-    # Processar cabeçalho
-    elementos.append(Paragraph(nome_candidato.upper(), estilo_nome))
+    # O cabeçalho é desenhado no canvas; aqui só se reserva o espaço dele
+    cabecalho = _espaco_cabecalho(estilos)
+    elementos.append(cabecalho)
+    append = elementos.append
 
-    # Coletar informações de contato
+    # Uma única passada: as linhas logo após o nome são contatos até a primeira linha vazia ou
+    # título de seção; dali em diante cada linha é despachada pela tabela de tratadores
     contatos = []
-    for linha in linhas[1:]:
-        if linha.strip() and not re.match(r"^[A-Z][A-Z\s]+:$", linha.strip()):
-            contatos.append(linha.strip())
-        else:
-            break
+    coletando_contatos = True
+    contexto = 'inicio'
+    for linha in linhas:
+        linha = linha.strip()
+        tipo = classificar_linha(linha)
+        if coletando_contatos:
+            if tipo != LINHA_VAZIA and tipo != LINHA_SECAO:
+                contatos.append(linha)
+                continue
+            coletando_contatos = False
+            _reservar_contatos(cabecalho, contatos)
+        contexto = _TRATADORES[tipo](linha, append, contexto, estilos)
 
-    if contatos:
-        elementos.append(criar_tabela_contato(contatos))
-        elementos.append(divisor_secao)
+    if coletando_contatos:
+        _reservar_contatos(cabecalho, contatos)
 
-    # Processar conteúdo principal
-    contexto = 'inicio'
-    for linha in linhas[len(contatos)+1:]:
-        contexto = processar_linha(linha, elementos, contexto)
+    elementos = _juntar_detalhes(elementos, estilos)
 
     try:
-        doc.build(elementos)
+        doc.build(elementos, onFirstPage=functools.partial(_desenhar_cabecalho, nome_candidato.upper(), contatos))
     except Exception as e:
         raise RuntimeError(f"Erro na geração do PDF: {str(e)}")
 
-    buffer.seek(0)
+    if output is None:
+        buffer.seek(0)
     return buffer
+
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _obter_pool() -> ProcessPoolExecutor:
+    """Cria o pool de processos na primeira geração assíncrona, não no import.
+
+    Os workers usam 'spawn': um fork copiaria um processo que já tem canais gRPC e a thread de logging ativos.
+    """
+    global _PROCESS_POOL
+    if _PROCESS_POOL is None:
+        _PROCESS_POOL = ProcessPoolExecutor(
+            max_workers=PDF_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _PROCESS_POOL
+
+
+def encerrar_pool():
+    """Encerra o pool de processos (no shutdown da aplicação); uma nova geração o recria."""
+    global _PROCESS_POOL
+    if _PROCESS_POOL is not None:
+        _PROCESS_POOL.shutdown(cancel_futures=True)
+        _PROCESS_POOL = None
+
+
+def _descartar_pool(pool: ProcessPoolExecutor):
+    """Descarta um pool quebrado para que _obter_pool crie outro (só se ainda for o pool atual)."""
+    global _PROCESS_POOL
+    if _PROCESS_POOL is pool:
+        _PROCESS_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def criar_pdf_ats_formatado_async(texto_cv: str, nome_candidato: str) -> BytesIO:
+    """Gera o PDF em um processo separado: o layout do ReportLab é CPU-bound e segura o GIL.
+
+    Se um worker morrer (ex.: OOM), o pool fica inutilizável; ele é recriado e a geração tentada mais uma vez.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _obter_pool()
+    try:
+        return await loop.run_in_executor(pool, criar_pdf_ats_formatado, texto_cv, nome_candidato)
+    except BrokenProcessPool as e:
+        logger.warning("Pool de geração de PDF quebrado, recriando: %s", e)
+        _descartar_pool(pool)
+        return await loop.run_in_executor(_obter_pool(), criar_pdf_ats_formatado, texto_cv, nome_candidato)